@@ -1,38 +1,102 @@
 import openai
 import traceback
 import os
+import base64
+import logging
+import math
+import mimetypes
+from dataclasses import dataclass
 from typing import List
 from schemas import Argument, Judgement, Appeal
 
 client = openai.OpenAI()
+logger = logging.getLogger(__name__)
+JUDGE_MODEL = "gpt-4o-2024-08-06"
+
+# Per-argument token budget; longer arguments are truncated before judging.
+MAX_ARGUMENT_TOKENS = int(os.environ.get("MAX_ARGUMENT_TOKENS", 2000))
 # client.api_key = os.getenv("OPENAI_API_KEY")
 #test
 # if not client.api_key:
 #     raise ValueError("No OpenAI API key found. Please set the OPENAI_API_KEY environment variable.")
 
-def get_ai_judgement(arguments: List[Argument], appeal: Appeal | None = None):
+@dataclass
+class PreparedArgument:
+    """An argument with the per-argument work done, ready for the comparative judgement."""
+    user_id: str
+    username: str
+    content: str
+    tokens: int
+    image_data_url: str | None = None
+
+
+def count_tokens(text: str) -> int:
+    # Roughly four characters per token for English text with GPT-4o tokenizers
+    return math.ceil(len(text) / 4)
+
+
+def enforce_budget(text: str, max_tokens: int = MAX_ARGUMENT_TOKENS) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4] + " [truncated]"
+
+
+def encode_image(image_url: str | None) -> str | None:
+    if not image_url:
+        return None
+    # Uploaded images are stored under images/ and served from /images/
+    path = image_url.lstrip("/")
+    try:
+        with open(path, "rb") as image_file:
+            data = base64.b64encode(image_file.read()).decode("ascii")
+    except OSError as e:
+        logger.warning(f"Could not encode image {image_url}: {e}")
+        return None
+    mime_type = mimetypes.guess_type(path)[0] or "image/png"
+    return f"data:{mime_type};base64,{data}"
+
+
+def prepare_argument(arg) -> PreparedArgument:
+    """Do the work that only needs a single argument, so it can run before the other side arrives."""
+    if isinstance(arg, PreparedArgument):
+        return arg
+    content = enforce_budget(arg.content)
+    return PreparedArgument(
+        user_id=arg.user_id,
+        username=arg.username,
+        content=content,
+        tokens=count_tokens(content),
+        image_data_url=encode_image(getattr(arg, "image_url", None)),
+    )
+
+
+def get_ai_judgement(arguments: List[Argument | PreparedArgument], appeal: Appeal | None = None, model: str = JUDGE_MODEL):
     prompt = """You are an AI judge for a debate app. Your task is to evaluate arguments and always choose a winner, even in subjective cases. Focus on the relative strength of the arguments rather than the absolute truth of the claims. Make your judgement fun and engaging. Respond in JSON format.
 
     Arguments:
     """
-    print("DEBUG PRINT, CONTENT OF arguments IS: ", arguments)
+    arguments = [prepare_argument(arg) for arg in arguments]
+    images = []
     for i, arg in enumerate(arguments, 1):
-        prompt += f"Argument {i} by {arg.username}:\n{arg.content}\n\n"  # Include username in prompt
-        print("DEBUG PRINT, arg.username and rg.content are: ", arg.username, arg.content)
+        # Include username and user id so the verdict can name the winner's id
+        prompt += f"Argument {i} by {arg.username} (user id {arg.user_id}):\n{arg.content}\n\n"
+        if arg.image_data_url:
+            prompt += f"Argument {i} includes an attached image.\n\n"
+            images.append({"type": "image_url", "image_url": {"url": arg.image_data_url}})
 
     if appeal:
         prompt += f"Appeal:\n{appeal.content}\n\n"
 
-    prompt += """Please provide your judgement, including the content (full judgement text), winner (the username of the winner), winning argument, loser (the username of the loser), losing argument, and reasoning. Remember:
+    prompt += """Please provide your judgement, including the content (full judgement text), winner (the username of the winner), winning argument, winning_user_id (the user id given with the winning argument), loser (the username of the loser), losing argument, losing_user_id (the user id given with the losing argument), and reasoning. Remember:
     1. Always choose a winner.
     2. Even if the topic is subjective, make a definitive choice based on argument quality."""
 
     try:
         completion = client.beta.chat.completions.parse(
-            model="gpt-4o-2024-08-06",
+            model=model,
             messages=[
                 {"role": "system", "content": "You are an AI judge for a debate app. Always choose a winner."},
-                {"role": "user", "content": prompt}
+                {"role": "user", "content": [{"type": "text", "text": prompt}, *images] if images else prompt}
             ],
             response_format=Judgement
         )
@@ -53,3 +117,15 @@ def get_ai_judgement(arguments: List[Argument], appeal: Appeal | None = None):
             "losing_argument": "Unable to determine",
             "reasoning": f"An error occurred: {str(e)}"
         }
+
+
+def resolve_usernames(judgement_data: dict, arguments: List[Argument | PreparedArgument]) -> dict:
+    """Replace the winner and loser with the usernames behind the judged user ids."""
+    # Find the arguments with matching user IDs
+    winning_argument = next((arg for arg in arguments if arg.user_id == judgement_data.get('winning_user_id')), None)
+    losing_argument = next((arg for arg in arguments if arg.user_id == judgement_data.get('losing_user_id')), None)
+
+    # Update the winner and loser fields with usernames
+    judgement_data['winner'] = winning_argument.username if winning_argument else "Unknown"
+    judgement_data['loser'] = losing_argument.username if losing_argument else "Unknown"
+    return judgement_data
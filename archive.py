@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, MetaData, String, Table, and_, delete, exists, func, make_url, select, text
+from sqlalchemy.orm import Session
+
+import models
+from bulk import CHILD_TABLES, dumps_record, records_for_sessions, row_from_dict
+from database import SessionLocal, engine, make_engine
+from migrations import run_migrations
+
+logger = logging.getLogger(__name__)
+
+# Finished sessions leave the hot database for a compressed cold store. A
+# session is finished once it has been judged, the appeal window has passed and
+# no appeal is still waiting for its judgement.
+ARCHIVE_DATABASE_URL = os.environ.get("ARCHIVE_DATABASE_URL", "sqlite:///./archive.db")
+APPEAL_WINDOW = timedelta(hours=float(os.environ.get("APPEAL_WINDOW_HOURS", 24)))
+IMAGES_DIR = "images"
+# Images are written before their argument is committed, so recent files are never collected.
+IMAGE_GRACE_PERIOD = timedelta(hours=1)
+
+archive_metadata = MetaData()
+
+archived_sessions = Table(
+    "archived_sessions", archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("archived_at", DateTime, default=datetime.utcnow),
+    # zlib-compressed JSON in the same record format as the bulk export
+    Column("payload", LargeBinary),
+)
+
+archived_images = Table(
+    "archived_images", archive_metadata,
+    Column("image_url", String, primary_key=True),
+    Column("session_id", Integer, index=True),
+)
+
+_archive_engine = None
+
+
+def get_archive_engine():
+    # Created on first use so importing crud never touches the archive
+    global _archive_engine
+    if _archive_engine is None:
+        _archive_engine = make_engine(ARCHIVE_DATABASE_URL)
+        archive_metadata.create_all(bind=_archive_engine)
+    return _archive_engine
+
+
+def archive_available() -> bool:
+    # Reads must not create an empty SQLite archive, e.g. on a read-only filesystem
+    url = make_url(ARCHIVE_DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        return bool(url.database) and os.path.exists(url.database)
+    return True
+
+
+def appeal_window_closed(judgement: models.Judgement) -> bool:
+    return judgement.judged_at is not None and datetime.utcnow() - judgement.judged_at > APPEAL_WINDOW
+
+
+def _decode(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload))
+
+
+def iter_archived_pages(page_size: int = 500) -> Iterator[List[dict]]:
+    """Yield archived session records in id order, one page at a time."""
+    if not archive_available():
+        return
+    after_id = 0
+    while True:
+        with get_archive_engine().connect() as connection:
+            rows = connection.execute(
+                select(archived_sessions.c.id, archived_sessions.c.payload)
+                .where(archived_sessions.c.id > after_id)
+                .order_by(archived_sessions.c.id)
+                .limit(page_size)
+            ).all()
+        if not rows:
+            return
+        yield [_decode(row.payload) for row in rows]
+        after_id = rows[-1].id
+
+
+def load_session(session_id: int) -> models.Session | None:
+    """Rebuild an archived session as a transient, read-only models.Session."""
+    if not archive_available():
+        return None
+    with get_archive_engine().connect() as connection:
+        payload = connection.execute(
+            select(archived_sessions.c.payload).where(archived_sessions.c.id == session_id)
+        ).scalar()
+    if payload is None:
+        return None
+
+    record = _decode(payload)
+    children = {
+        field: [model(**row_from_dict(model, row)) for row in record.pop(field, None) or []]
+        for field, model in CHILD_TABLES.items()
+    }
+    session = models.Session(**row_from_dict(models.Session, record))
+    session.archived = True
+    session.arguments = children["arguments"]
+    session.appeals = children["appeals"]
+    # The archive keeps every row; the one-per-session relationships show the latest
+    if children["judgements"]:
+        session.judgement = children["judgements"][-1]
+    if children["appeal_judgements"]:
+        session.appeal_judgement = children["appeal_judgements"][-1]
+    return session
+
+
+def _newest_row_sessions(db: Session) -> set:
+    """Ids of the sessions that own the newest row of the session and child tables.
+
+    SQLite hands out max(id) + 1 to new rows, so these sessions stay hot to keep
+    archived ids of every table from ever being reused.
+    """
+    newest = {db.query(func.max(models.Session.id)).scalar()}
+    for model in CHILD_TABLES.values():
+        newest.add(db.query(model.session_id).order_by(model.id.desc()).limit(1).scalar())
+    newest.discard(None)
+    return newest
+
+
+def _finished_sessions(db: Session, batch_size: int) -> List[dict]:
+    keep_hot = _newest_row_sessions(db)
+    if not keep_hot:
+        return []
+    unanswered_appeal = and_(
+        exists().where(models.Appeal.session_id == models.Session.id),
+        ~exists().where(models.AppealJudgement.session_id == models.Session.id),
+    )
+    query = (
+        select(models.Session.__table__)
+        .join(models.Judgement.__table__, models.Judgement.session_id == models.Session.id)
+        .where(
+            models.Judgement.judged_at < datetime.utcnow() - APPEAL_WINDOW,
+            ~unanswered_appeal,
+            models.Session.id.notin_(keep_hot),
+        )
+        .order_by(models.Session.id)
+        .limit(batch_size)
+    )
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def archive_finished_sessions(db: Session, batch_size: int = 500) -> int:
+    """Move finished sessions to the cold store and delete them from the hot tables.
+
+    Shadow judgements stay where they are; they are not on the hot read path.
+    """
+    archived = 0
+    while True:
+        sessions = _finished_sessions(db, batch_size)
+        if not sessions:
+            return archived
+        records = records_for_sessions(db, sessions)
+        ids = [record["id"] for record in records]
+
+        # Write the cold copy first. If the hot delete then fails, the session
+        # is simply archived again on the next run and the hot copy still wins.
+        with get_archive_engine().begin() as connection:
+            connection.execute(delete(archived_sessions).where(archived_sessions.c.id.in_(ids)))
+            connection.execute(delete(archived_images).where(archived_images.c.session_id.in_(ids)))
+            connection.execute(archived_sessions.insert(), [
+                {"id": record["id"], "payload": zlib.compress(dumps_record(record).encode())}
+                for record in records
+            ])
+            images = [
+                {"image_url": arg["image_url"], "session_id": record["id"]}
+                for record in records for arg in record["arguments"] if arg["image_url"]
+            ]
+            if images:
+                connection.execute(archived_images.insert(), images)
+
+        # Delete exactly the rows that went into the cold copy
+        for field, model in CHILD_TABLES.items():
+            row_ids = [row["id"] for record in records for row in record[field]]
+            if row_ids:
+                db.execute(delete(model).where(model.id.in_(row_ids)))
+        db.execute(delete(models.Session).where(models.Session.id.in_(ids)))
+        db.commit()
+
+        archived += len(ids)
+        logger.info(f"Archived {archived} sessions")
+
+
+def collect_orphaned_images(db: Session) -> int:
+    """Delete uploaded images that no hot or archived argument refers to."""
+    if not os.path.isdir(IMAGES_DIR):
+        return 0
+    referenced = {url for (url,) in db.query(models.Argument.image_url).filter(models.Argument.image_url.isnot(None))}
+    if archive_available():
+        with get_archive_engine().connect() as connection:
+            referenced.update(connection.execute(select(archived_images.c.image_url)).scalars())
+
+    cutoff = time.time() - IMAGE_GRACE_PERIOD.total_seconds()
+    removed = 0
+    for name in os.listdir(IMAGES_DIR):
+        path = os.path.join(IMAGES_DIR, name)
+        if f"/images/{name}" in referenced or not os.path.isfile(path) or os.path.getmtime(path) > cutoff:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def vacuum(bind=engine):
+    # VACUUM cannot run inside a transaction on either SQLite or Postgres
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if bind.dialect.name == "postgresql":
+            connection.execute(text("VACUUM ANALYZE"))
+        else:
+            connection.execute(text("VACUUM"))
+            connection.execute(text("PRAGMA optimize"))
+
+
+def compact(db: Session) -> int:
+    removed = collect_orphaned_images(db)
+    # End the read transaction, otherwise SQLite's VACUUM waits on our own lock
+    db.rollback()
+    vacuum()
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move finished debates to the cold store and compact the hot database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    archive_parser = subparsers.add_parser("archive", help="Archive judged sessions past the appeal window")
+    archive_parser.add_argument("--batch-size", type=int, default=500)
+    subparsers.add_parser("compact", help="Remove orphaned images and vacuum the hot database")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        if args.command == "archive":
+            print(f"Archived {archive_finished_sessions(db, batch_size=args.batch_size)} sessions")
+        else:
+            print(f"Removed {compact(db)} orphaned images")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import ENGINE_PROFILES, PROFILE_BACKENDS, make_engine
+
+
+def _writer(SessionFactory, writes: int) -> int:
+    errors = 0
+    db = SessionFactory()
+    try:
+        for i in range(writes):
+            try:
+                db.add(models.Session(name=f"bench {i}", description="benchmark"))
+                db.commit()
+            except Exception:
+                db.rollback()
+                errors += 1
+    finally:
+        db.close()
+    return errors
+
+
+def run(url: str, profile: str, writers: int, writes: int):
+    bench_engine = make_engine(url, profile)
+    models.Base.metadata.create_all(bind=bench_engine)
+    SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=bench_engine)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        errors = sum(pool.map(lambda _: _writer(SessionFactory, writes), range(writers)))
+    elapsed = time.perf_counter() - start
+    bench_engine.dispose()
+
+    committed = writers * writes - errors
+    print(f"{profile:16} {writers} writers x {writes} commits: {committed / elapsed:8.0f} writes/s, {errors} failed")
+
+
+def scratch_url(profile: str, sqlite_dir: str, postgres_url: str | None) -> str | None:
+    if PROFILE_BACKENDS[profile] == "postgresql" or (PROFILE_BACKENDS[profile] is None and postgres_url):
+        return postgres_url
+    # A fresh SQLite file per profile: WAL mode persists in the file and would
+    # otherwise carry over into the next profile's run.
+    path = os.path.join(sqlite_dir, f"bench-{profile}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return f"sqlite:///{path}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent session inserts under each engine profile.")
+    parser.add_argument("--sqlite-dir", default=".", help="Directory for the per-profile scratch SQLite files")
+    parser.add_argument("--postgres-url", help="Scratch Postgres database for postgres-pooled and serverless")
+    parser.add_argument("--profile", action="append", choices=ENGINE_PROFILES, help="Profile to run, repeatable")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    for profile in args.profile or ENGINE_PROFILES:
+        url = scratch_url(profile, args.sqlite_dir, args.postgres_url)
+        if url is None:
+            print(f"{profile:16} skipped: needs --postgres-url")
+            continue
+        run(url, profile, args.writers, args.writes)
@@ -0,0 +1,196 @@
+import argparse
+import json
+from datetime import datetime
+import sys
+import time
+from typing import Iterable, Iterator, List, TextIO
+
+from sqlalchemy import DateTime, insert, select, text
+from sqlalchemy.orm import Session
+
+import models
+from database import ReadSessionLocal, SessionLocal, engine
+
+# Tables in insert order (parents before children), keyed by the record field
+# each one is nested under in an exported session line. Every field is a list,
+# even for one-per-session relationships, so duplicate rows are never hidden.
+CHILD_TABLES = {
+    "arguments": models.Argument,
+    "judgements": models.Judgement,
+    "appeals": models.Appeal,
+    "appeal_judgements": models.AppealJudgement,
+}
+
+
+def row_from_dict(model, data: dict) -> dict:
+    """Convert a row loaded from JSON back into column values, parsing datetimes."""
+    row = dict(data)
+    for column in model.__table__.columns:
+        if isinstance(column.type, DateTime) and isinstance(row.get(column.name), str):
+            row[column.name] = datetime.fromisoformat(row[column.name])
+    return row
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_record(record: dict) -> str:
+    return json.dumps(record, default=_json_default)
+
+
+def records_for_sessions(db: Session, sessions: List[dict]) -> List[dict]:
+    """Build export records for session rows, with every child row of each session.
+
+    Child tables are queried directly by session_id rather than through the ORM
+    relationships, which collapse one-per-session relationships to a single row.
+    """
+    records = {session["id"]: {**session, **{field: [] for field in CHILD_TABLES}} for session in sessions}
+    for field, model in CHILD_TABLES.items():
+        table = model.__table__
+        rows = db.execute(select(table).where(table.c.session_id.in_(records)).order_by(table.c.id)).mappings()
+        for row in rows:
+            records[row["session_id"]][field].append(dict(row))
+    return list(records.values())
+
+
+def iter_records(db: Session, batch_size: int = 1000) -> Iterator[dict]:
+    # yield_per streams sessions through a server-side cursor, and the children
+    # of each batch are fetched with one query per table.
+    result = db.execute(
+        select(models.Session.__table__).order_by(models.Session.id),
+        execution_options={"yield_per": batch_size},
+    )
+    for sessions in result.mappings().partitions():
+        yield from records_for_sessions(db, [dict(session) for session in sessions])
+
+
+def iter_archived_records(db: Session, batch_size: int = 1000) -> Iterator[dict]:
+    # Imported here because archive builds on the record helpers in this module
+    import archive
+
+    for page in archive.iter_archived_pages(page_size=batch_size):
+        # A session still in the hot tables (an interrupted archive run) was already exported
+        ids = [record["id"] for record in page]
+        hot_ids = set(db.execute(select(models.Session.id).where(models.Session.id.in_(ids))).scalars())
+        yield from (record for record in page if record["id"] not in hot_ids)
+
+
+def export_ndjson(db: Session, batch_size: int = 1000) -> Iterator[str]:
+    for record in iter_records(db, batch_size=batch_size):
+        yield dumps_record(record) + "\n"
+    for record in iter_archived_records(db, batch_size=batch_size):
+        yield dumps_record(record) + "\n"
+
+
+def stream_export(batch_size: int = 1000) -> Iterator[str]:
+    db = ReadSessionLocal()
+    try:
+        yield from export_ndjson(db, batch_size=batch_size)
+    finally:
+        db.close()
+
+
+def _flush_rows(db: Session, rows: dict):
+    db.execute(insert(models.Session.__table__), rows["sessions"])
+    for field, model in CHILD_TABLES.items():
+        if rows[field]:
+            db.execute(insert(model.__table__), rows[field])
+    db.commit()
+
+
+def _reset_sequences(db: Session):
+    # Imported rows keep their ids, so Postgres sequences must be moved past them.
+    if db.bind.dialect.name != "postgresql":
+        return
+    for model in [models.Session, *CHILD_TABLES.values()]:
+        table = model.__tablename__
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
+    db.commit()
+
+
+def import_ndjson(db: Session, lines: Iterable[str], batch_size: int = 1000) -> dict:
+    """Insert exported session lines with one executemany per table per batch."""
+    counts = {"sessions": 0, **{field: 0 for field in CHILD_TABLES}}
+    rows = {"sessions": [], **{field: [] for field in CHILD_TABLES}}
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        for field, model in CHILD_TABLES.items():
+            rows[field].extend(row_from_dict(model, row) for row in record.pop(field, None) or [])
+        rows["sessions"].append(row_from_dict(models.Session, record))
+
+        if len(rows["sessions"]) >= batch_size:
+            _flush_rows(db, rows)
+            for key in rows:
+                counts[key] += len(rows[key])
+                rows[key] = []
+
+    if rows["sessions"]:
+        _flush_rows(db, rows)
+        for key in rows:
+            counts[key] += len(rows[key])
+
+    _reset_sequences(db)
+    return counts
+
+
+def _export(out: TextIO, batch_size: int) -> int:
+    count = 0
+    for line in stream_export(batch_size=batch_size):
+        out.write(line)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export and import of debate sessions as NDJSON.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write every hot and archived session to an NDJSON file")
+    export_parser.add_argument("path", nargs="?", default="-", help="Output file, '-' for stdout")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+
+    import_parser = subparsers.add_parser("import", help="Load sessions from an NDJSON export")
+    import_parser.add_argument("path", nargs="?", default="-", help="Input file, '-' for stdin")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+
+    if args.command == "export":
+        if args.path == "-":
+            count = _export(sys.stdout, args.batch_size)
+        else:
+            with open(args.path, "w") as out:
+                count = _export(out, args.batch_size)
+        elapsed = time.perf_counter() - start
+        rate = f"{count / elapsed if elapsed else 0:.0f} sessions/s"
+        summary = f"Exported {count} sessions"
+    else:
+        models.Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        try:
+            if args.path == "-":
+                counts = import_ndjson(db, sys.stdin, batch_size=args.batch_size)
+            else:
+                with open(args.path) as source:
+                    counts = import_ndjson(db, source, batch_size=args.batch_size)
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - start
+        rate = f"{sum(counts.values()) / elapsed if elapsed else 0:.0f} rows/s"
+        summary = "Imported " + ", ".join(f"{value} {key}" for key, value in counts.items())
+
+    print(f"{summary} in {elapsed:.2f}s ({rate})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
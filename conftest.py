@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import pytest
+
+# Separate primary, replica and archive files, set before database.py reads them
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/primary.db"
+os.environ["DATABASE_REPLICA_URL"] = f"sqlite:///{_tmp}/replica.db"
+os.environ["ARCHIVE_DATABASE_URL"] = f"sqlite:///{_tmp}/archive.db"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import archive, database, models
+import main
+
+# In production the replica is fed by replication; here it gets its own tables
+models.Base.metadata.create_all(bind=database.read_engine)
+
+
+@pytest.fixture(autouse=True)
+def empty_databases(tmp_path, monkeypatch):
+    # Uploaded images are written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("images")
+    yield
+    for bind in {database.engine, database.read_engine}:
+        with bind.begin() as connection:
+            for table in reversed(models.Base.metadata.sorted_tables):
+                connection.execute(table.delete())
+    if archive.archive_available():
+        with archive.get_archive_engine().begin() as connection:
+            for table in archive.archive_metadata.sorted_tables:
+                connection.execute(table.delete())
+
+
+@pytest.fixture
+def fake_judge(monkeypatch):
+    """Replace the model call with one that always picks the first argument."""
+    calls = []
+
+    def get_ai_judgement(arguments, appeal=None, model=None):
+        calls.append(arguments)
+        winner, loser = arguments[0], arguments[-1]
+        return {
+            "content": "Judged", "winner": winner.username, "winning_argument": winner.content,
+            "winning_user_id": winner.user_id, "loser": loser.username, "losing_argument": loser.content,
+            "losing_user_id": loser.user_id, "reasoning": "Test",
+        }
+
+    monkeypatch.setattr(main, "get_ai_judgement", get_ai_judgement)
+    return calls
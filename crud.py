@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, File
-import models, schemas
+import archive, models, schemas
 import uuid
 import random
 import string
 import os
 
 
+# Write helpers only stage changes on the session. The caller commits once for
+# the whole request so each request is a single transaction.
+
+
 def generate_unique_username():
     return 'user' + ''.join(random.choices(string.digits, k=5))
 
@@ -20,12 +24,14 @@ def create_session(db: Session, session: schemas.SessionCreate):
         user2_name=session.user2_name
     )
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
     return db_session
 
 def get_session(db: Session, session_id: int):
-    return db.query(models.Session).filter(models.Session.id == session_id).first()
+    session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if session is None:
+        # Finished sessions may have been moved to the cold store
+        session = archive.load_session(session_id)
+    return session
 
 def update_session_username(db: Session, session_id: int, user: str, username: str, user_id: str):
     session = db.query(models.Session).filter(models.Session.id == session_id).first()
@@ -39,8 +45,6 @@ def update_session_username(db: Session, session_id: int, user: str, username: s
     else:
         return None
 
-    db.commit()
-    db.refresh(session)
     return session
 
 async def create_argument(db: Session, argument: schemas.ArgumentCreate, session_id: int, user_id: str, username: str, image: UploadFile = None):
@@ -55,8 +59,6 @@ async def create_argument(db: Session, argument: schemas.ArgumentCreate, session
         image_url = f"/images/{image_name}"
         db_argument.image_url = image_url
     db.add(db_argument)
-    db.commit()
-    db.refresh(db_argument)
     return db_argument
 
 # async def create_argument(db: Session, argument: schemas.ArgumentCreate, session_id: int, user_id: str, image: UploadFile = None):
@@ -76,14 +78,6 @@ def get_arguments_by_session(db: Session, session_id: int):
 def create_judgement(db: Session, judgement: schemas.JudgementCreate, session_id: int):
     db_judgement = models.Judgement(**judgement.dict(), session_id=session_id)
     db.add(db_judgement)
-    db.commit()
-    db.refresh(db_judgement)
-
-    # Update the session with the new judgement
-    session = db.query(models.Session).filter(models.Session.id == session_id).first()
-    session.judgement = db_judgement
-    db.commit()
-
     return db_judgement
 
 def update_judgement(db: Session, session_id: int, judgement: schemas.JudgementCreate):
@@ -91,25 +85,17 @@ def update_judgement(db: Session, session_id: int, judgement: schemas.JudgementC
     if db_judgement:
         for key, value in judgement.dict().items():
             setattr(db_judgement, key, value)
-        db.commit()
-        db.refresh(db_judgement)
     else:
         db_judgement = models.Judgement(**judgement.dict(), session_id=session_id)
         db.add(db_judgement)
-        db.commit()
-        db.refresh(db_judgement)
     return db_judgement
 
 def create_appeal(db: Session, appeal: schemas.AppealCreate, session_id: int):
     db_appeal = models.Appeal(**appeal.dict(), session_id=session_id)
     db.add(db_appeal)
-    db.commit()
-    db.refresh(db_appeal)
     return db_appeal
 
 def create_appeal_judgement(db: Session, appeal_judgement: schemas.AppealJudgementCreate, session_id: int):
     db_appeal_judgement = models.AppealJudgement(**appeal_judgement.dict(), session_id=session_id)
     db.add(db_appeal_judgement)
-    db.commit()
-    db.refresh(db_appeal_judgement)
     return db_appeal_judgement
@@ -1,22 +1,78 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
+def _normalize_url(url: str | None) -> str | None:
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
 
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-if DATABASE_URL:
-    engine = create_engine(DATABASE_URL)
-else:
+DATABASE_URL = _normalize_url(os.environ.get("DATABASE_URL"))
+# Optional read replica. Read-only work goes through ReadSessionLocal, which
+# falls back to the primary when no replica is configured.
+DATABASE_REPLICA_URL = _normalize_url(os.environ.get("DATABASE_REPLICA_URL"))
+
+if not DATABASE_URL:
     # Fallback to SQLite for local development
-    SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
+    DATABASE_URL = "sqlite:///./sql_app.db"
+
+# Named engine profiles, selected with DATABASE_PROFILE. When unset, SQLite
+# databases use "sqlite-wal" and everything else uses "postgres-pooled".
+ENGINE_PROFILES = ("sqlite-wal", "postgres-pooled", "serverless")
+# Backend each profile is tuned for; None means any backend.
+PROFILE_BACKENDS = {"sqlite-wal": "sqlite", "postgres-pooled": "postgresql", "serverless": None}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer commits, and busy_timeout makes
+    # concurrent writers wait for the lock instead of failing immediately.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    cursor.close()
+
+
+def make_engine(url: str, profile: str | None = None):
+    backend = make_url(url).get_backend_name()
+    is_sqlite = backend == "sqlite"
+    profile = profile or ("sqlite-wal" if is_sqlite else "postgres-pooled")
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE {profile!r}, expected one of {', '.join(ENGINE_PROFILES)}")
+    if PROFILE_BACKENDS[profile] not in (None, backend):
+        raise ValueError(f"DATABASE_PROFILE {profile!r} needs a {PROFILE_BACKENDS[profile]} database, got {backend}")
+
+    kwargs = {}
+    if is_sqlite:
+        kwargs["connect_args"] = {"check_same_thread": False}
+
+    if profile == "postgres-pooled":
+        kwargs.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+            pool_pre_ping=True,
+        )
+    elif profile == "serverless":
+        # Short-lived function instances should not hold connections between invocations.
+        kwargs.update(poolclass=NullPool, pool_pre_ping=True)
+
+    db_engine = create_engine(url, **kwargs)
+    if profile == "sqlite-wal":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE")
+engine = make_engine(DATABASE_URL, DATABASE_PROFILE)
+read_engine = make_engine(DATABASE_REPLICA_URL, DATABASE_PROFILE) if DATABASE_REPLICA_URL else engine
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Handlers commit once per request, so objects stay loaded after the commit
+# instead of being re-selected on the next attribute access.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
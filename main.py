@@ -1,15 +1,20 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, File, UploadFile, Form, Query, Body, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, File, UploadFile, Form, Query, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Dict
 import logging
 from starlette.websockets import WebSocketDisconnect
+import asyncio
 import json
+import time
 import traceback
-import crud, models, schemas
-from database import SessionLocal, engine
-from ai_judge import get_ai_judgement, Judgement
+import archive, crud, models, schemas
+from database import ReadSessionLocal, SessionLocal, engine
+from migrations import run_migrations
+from ai_judge import get_ai_judgement, resolve_usernames, Judgement
+from speculative import SpeculativePreparer
 
 
 class UsernameUpdate(BaseModel):
@@ -19,6 +24,7 @@ class UsernameUpdate(BaseModel):
 
 
 models.Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 #app = FastAPI()
 app = FastAPI(root_path="/api")
@@ -68,6 +74,22 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_writable_session(db: Session, session_id: int) -> models.Session:
+    session = crud.get_session(db, session_id=session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.archived:
+        # Archived sessions only exist in the cold store; writes would be orphaned in the hot tables
+        raise HTTPException(status_code=409, detail="Session is archived and read-only")
+    return session
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[int, List[WebSocket]] = {}
@@ -90,31 +112,51 @@ class ConnectionManager:
                 await connection.send_json(message)
 
 manager = ConnectionManager()
+speculator = SpeculativePreparer()
+
+@app.on_event("shutdown")
+def cancel_speculative_work():
+    speculator.cancel_all()
+
+@app.get("/metrics/speculative/")
+def speculative_metrics():
+    return speculator.snapshot()
 
 @app.post("/sessions/", response_model=schemas.Session)
 def create_session(session: schemas.SessionCreate, db: Session = Depends(get_db)):
     try:
-        return crud.create_session(db=db, session=session)
+        db_session = crud.create_session(db=db, session=session)
+        db.commit()
+        return db_session
     except Exception as e:
         logger.error(f"Error creating session: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/sessions/{session_id}", response_model=schemas.Session)
-def read_session(session_id: int, userId: str = Query(...), db: Session = Depends(get_db)):
-    db_session = crud.get_session(db, session_id=session_id)
+def read_session(
+    session_id: int,
+    userId: str = Query(...),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    # A session that is missing on the replica may just not have replicated yet
+    db_session = crud.get_session(read_db, session_id=session_id) or crud.get_session(db, session_id=session_id)
     if db_session is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if not db_session.user1_id:
-        db_session.user1_id = userId
-        db_session.user1_name = f"User {userId}"  # Set a default name
-        db.commit()
-    elif not db_session.user2_id and db_session.user1_id != userId:
-        db_session.user2_id = userId
-        db_session.user2_name = f"User {userId}"  # Set a default name
-        db.commit()
+    # Only claiming an empty participant slot needs the primary
+    needs_claim = not db_session.user1_id or (not db_session.user2_id and db_session.user1_id != userId)
+    if needs_claim and not db_session.archived:
+        db_session = crud.get_session(db, session_id=session_id)
+        if not db_session.user1_id:
+            db_session.user1_id = userId
+            db_session.user1_name = f"User {userId}"  # Set a default name
+            db.commit()
+        elif not db_session.user2_id and db_session.user1_id != userId:
+            db_session.user2_id = userId
+            db_session.user2_name = f"User {userId}"  # Set a default name
+            db.commit()
 
-    db.refresh(db_session)
     return db_session
 
 @app.websocket("/ws/{session_id}")
@@ -140,6 +182,7 @@ async def create_argument(
     image: UploadFile = File(None),
     db: Session = Depends(get_db)
 ):
+    get_writable_session(db, session_id)
     try:
         argument = await crud.create_argument(
             db=db,
@@ -149,13 +192,32 @@ async def create_argument(
             username=username,  # Add this line
             image=image
         )
+        # Commit the argument before judging so a failed judgement never loses user input
+        db.commit()
         logger.info(f"Created argument: {argument}")
 
-        # Check if this is the second argument
+        # Count after the commit: when both sides submit at once, neither sees
+        # the other's argument before its own commit, but the later one does now
         arguments = crud.get_arguments_by_session(db, session_id=session_id)
+
+        if len(arguments) == 1:
+            # Prepare the first argument while the other side is still writing
+            speculator.start(argument)
+
+        # Check if this is the second argument
+        judgement = None
         if len(arguments) == 2:
-            # Automatically trigger judgement
-            judgement = await judge_session(session_id, db)
+            # Automatically trigger judgement. Both requests can get here; the
+            # unique judgement per session lets only the first one store it.
+            try:
+                judgement = await judge_arguments(session_id, arguments, db, replace=False)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                judgement = None
+                logger.info(f"Session {session_id} was already judged by a concurrent request")
+
+        if judgement:
             await manager.broadcast(session_id, {
                 "message": "Judgement ready",
                 "judgement": schemas.Judgement.from_orm(judgement).dict()
@@ -174,7 +236,7 @@ async def create_argument(
 
 
 @app.post("/sessions/{session_id}/invite/")
-async def invite_user(session_id: int, email: str, userId: str, db: Session = Depends(get_db)):
+async def invite_user(session_id: int, email: str, userId: str, db: Session = Depends(get_read_db)):
     session = crud.get_session(db, session_id=session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -190,9 +252,7 @@ def update_username(
     update: UsernameUpdate,
     db: Session = Depends(get_db)
 ):
-    session = crud.get_session(db, session_id=session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = get_writable_session(db, session_id)
 
     if update.user == 'user1' and session.user1_id == update.userId:
         session.user1_name = update.username
@@ -202,49 +262,41 @@ def update_username(
         raise HTTPException(status_code=400, detail="Invalid user or userId")
 
     db.commit()
-    db.refresh(session)
     return session
 
+async def judge_arguments(session_id: int, arguments: List[models.Argument], db: Session, replace: bool = True) -> models.Judgement:
+    """Get the AI judgement for a session's arguments and stage it on ``db`` without committing.
+
+    With ``replace=False`` the judgement is only inserted, so committing it
+    fails with an IntegrityError if the session has been judged meanwhile.
+    """
+    start = time.perf_counter()
+    # Sort arguments based on user ID to ensure consistent order
+    arguments = sorted(arguments, key=lambda arg: arg.user_id)
+
+    #schema_arguments = [schemas.Argument.from_orm(arg) for arg in arguments]
+    #judgement_data = get_ai_judgement(schema_arguments)
+    prepared_arguments = await speculator.prepare(arguments)
+    # The model call runs in a worker thread so it doesn't block the event loop
+    judgement_data = resolve_usernames(await asyncio.to_thread(get_ai_judgement, prepared_arguments), arguments)
+    speculator.record_judgement(time.perf_counter() - start)
+
+    judgement_create = schemas.JudgementCreate(**judgement_data)
+    if not replace:
+        return crud.create_judgement(db=db, judgement=judgement_create, session_id=session_id)
+    # Judgements are unique per session, so re-judging replaces the existing one
+    return crud.update_judgement(db=db, session_id=session_id, judgement=judgement_create)
+
 @app.post("/sessions/{session_id}/judge/", response_model=schemas.Judgement)
 async def judge_session(session_id: int, db: Session = Depends(get_db)):
-    session = crud.get_session(db, session_id=session_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+    get_writable_session(db, session_id)
 
     arguments = crud.get_arguments_by_session(db, session_id=session_id)
     if len(arguments) < 2:
         raise HTTPException(status_code=400, detail="Not enough arguments to judge")
 
     try:
-        # Sort arguments based on user ID to ensure consistent order
-        arguments.sort(key=lambda arg: arg.user_id)
-
-        #schema_arguments = [schemas.Argument.from_orm(arg) for arg in arguments]
-        #judgement_data = get_ai_judgement(schema_arguments)
-        judgement_data = get_ai_judgement(arguments)
-
-        # Get usernames based on user IDs from judgement_data
-        winning_user_id = judgement_data.get('winning_user_id')
-        losing_user_id = judgement_data.get('losing_user_id')
-
-        # Find the arguments with matching user IDs
-        winning_argument = next((arg for arg in arguments if arg.user_id == winning_user_id), None)
-        losing_argument = next((arg for arg in arguments if arg.user_id == losing_user_id), None)
-
-        # Extract usernames if arguments are found
-        winning_username = winning_argument.username if winning_argument else "Unknown"
-        losing_username = losing_argument.username if losing_argument else "Unknown"
-
-        # Update the winner and loser fields with usernames
-        judgement_data['winner'] = winning_username
-        judgement_data['loser'] = losing_username
-
-        judgement_create = schemas.JudgementCreate(**judgement_data)
-        db_judgement = crud.create_judgement(db=db, judgement=judgement_create, session_id=session_id)
-
-        # Update the session with the new judgement
-        session = crud.get_session(db, session_id=session_id)
-        session.judgement = db_judgement
+        db_judgement = await judge_arguments(session_id, arguments, db)
         db.commit()
 
         # Broadcast the judgement
@@ -261,27 +313,28 @@ async def judge_session(session_id: int, db: Session = Depends(get_db)):
 
 @app.post("/sessions/{session_id}/appeal/", response_model=schemas.Appeal)
 async def create_appeal(session_id: int, appeal: schemas.AppealCreate, db: Session = Depends(get_db)):
-    try:
-        session = crud.get_session(db, session_id=session_id)
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
+    session = get_writable_session(db, session_id)
+    if not session.judgement:
+        raise HTTPException(status_code=400, detail="No judgment exists for this session yet")
 
-        if not session.judgement:
-            raise HTTPException(status_code=400, detail="No judgment exists for this session yet")
+    if archive.appeal_window_closed(session.judgement):
+        raise HTTPException(status_code=400, detail="The appeal window for this session has closed")
 
-        # Check if the appealing user is the loser
-        if appeal.user_id != session.judgement.loser:
-            raise HTTPException(status_code=403, detail="Only the losing party can submit an appeal")
+    # Check if the appealing user is the loser
+    if appeal.user_id != session.judgement.loser:
+        raise HTTPException(status_code=403, detail="Only the losing party can submit an appeal")
 
+    try:
         db_appeal = crud.create_appeal(db=db, appeal=appeal, session_id=session_id)
 
         # Get all arguments and the appeal
         arguments = crud.get_arguments_by_session(db, session_id=session_id)
-        appeal_judgement = get_ai_judgement(arguments, db_appeal)
+        appeal_judgement = await asyncio.to_thread(get_ai_judgement, arguments, db_appeal)
 
         appeal_judgement_create = schemas.AppealJudgementCreate(**appeal_judgement)
 
         db_appeal_judgement = crud.create_appeal_judgement(db=db, appeal_judgement=appeal_judgement_create, session_id=session_id)
+        db.commit()
 
         await manager.broadcast(session_id, {"message": "Appeal processed", "appeal_judgement": schemas.AppealJudgement.from_orm(db_appeal_judgement).dict()})
 
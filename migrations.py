@@ -0,0 +1,113 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def add_column(table: str, column: str, ddl_type: str):
+    def migrate(connection):
+        if column not in {c["name"] for c in inspect(connection).get_columns(table)}:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    return migrate
+
+
+def drop_foreign_key(table: str, column: str):
+    def migrate(connection):
+        # SQLite does not enforce these by default and cannot drop constraints
+        if connection.dialect.name == "sqlite":
+            return
+        for foreign_key in inspect(connection).get_foreign_keys(table):
+            if foreign_key["constrained_columns"] == [column] and foreign_key["name"]:
+                connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {foreign_key['name']}"))
+    return migrate
+
+
+def dedupe_judgements(connection):
+    # Keep the most recent judgement of any session judged more than once.
+    duplicates = (
+        "FROM judgements WHERE session_id IS NOT NULL AND id NOT IN "
+        "(SELECT MAX(id) FROM judgements WHERE session_id IS NOT NULL GROUP BY session_id)"
+    )
+    count = connection.execute(text(f"SELECT COUNT(*) {duplicates}")).scalar()
+    if count:
+        logger.warning(f"Deleting {count} older duplicate judgements so each session keeps its latest one")
+        connection.execute(text(f"DELETE {duplicates}"))
+
+
+# Versioned schema migrations, applied in order and recorded in
+# schema_migrations. create_all only creates missing tables, so any change to
+# an existing table has to be added here. Every step must be safe to run on a
+# database that create_all has just built from the current models; steps are
+# SQL strings or callables taking the connection.
+MIGRATIONS = [
+    (1, "Index session_id foreign keys", [
+        "CREATE INDEX IF NOT EXISTS ix_arguments_session_id ON arguments (session_id)",
+        "CREATE INDEX IF NOT EXISTS ix_appeals_session_id ON appeals (session_id)",
+        "CREATE INDEX IF NOT EXISTS ix_appeal_judgements_session_id ON appeal_judgements (session_id)",
+    ]),
+    (2, "One judgement per session", [
+        dedupe_judgements,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_judgements_session_id ON judgements (session_id)",
+    ]),
+    (3, "Record when sessions were judged", [
+        add_column("judgements", "judged_at", "TIMESTAMP"),
+        # Existing judgements start their appeal window now rather than being archived at once
+        "UPDATE judgements SET judged_at = CURRENT_TIMESTAMP WHERE judged_at IS NULL",
+    ]),
+    (4, "Let shadow judgements outlive archived sessions", [
+        drop_foreign_key("shadow_judgements", "session_id"),
+    ]),
+]
+
+
+def get_schema_version(connection) -> int:
+    connection.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY)"))
+    return connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+
+# Arbitrary key for the Postgres advisory lock that serialises migrations
+MIGRATION_LOCK_ID = 7_210_417
+
+
+def _lock_migrations(connection):
+    # Several workers can boot at once; hold a lock across reading the version
+    # and applying the migration so only one of them applies it.
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    elif connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations(bind=engine) -> int:
+    with bind.begin() as connection:
+        current = get_schema_version(connection)
+    if current >= MIGRATIONS[-1][0]:
+        return current
+
+    for version, description, statements in MIGRATIONS:
+        # Each migration commits on its own so a failure leaves earlier ones applied.
+        with bind.begin() as connection:
+            _lock_migrations(connection)
+            current = get_schema_version(connection)
+            if version <= current:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(text(statement))
+            connection.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": version})
+        logger.info(f"Applied migration {version}: {description}")
+        current = version
+
+    return current
+
+if __name__ == "__main__":
+    import models
+
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine)
+    print(f"Schema at version {run_migrations()}")
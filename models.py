@@ -1,4 +1,6 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -13,6 +15,8 @@ class Session(Base):
     user2_id = Column(String)
     user1_name = Column(String, default="")
     user2_name = Column(String, default="")
+    # Set on sessions rebuilt from the cold store, which are read-only
+    archived = False
 
     arguments = relationship("Argument", back_populates="session")
     judgement = relationship("Judgement", back_populates="session", uselist=False)
@@ -29,7 +33,7 @@ class AppealJudgement(Base):
     loser = Column(String)
     losing_argument = Column(Text)
     reasoning = Column(Text)
-    session_id = Column(Integer, ForeignKey("sessions.id"))
+    session_id = Column(Integer, ForeignKey("sessions.id"), index=True)
 
     session = relationship("Session", back_populates="appeal_judgement")
 
@@ -41,7 +45,7 @@ class Argument(Base):
     user_id = Column(String)
     username = Column(String)  # Add this line
     image_url = Column(String)
-    session_id = Column(Integer, ForeignKey("sessions.id"))
+    session_id = Column(Integer, ForeignKey("sessions.id"), index=True)
 
     session = relationship("Session", back_populates="arguments")
 
@@ -57,7 +61,8 @@ class Judgement(Base):
     losing_argument = Column(Text)
     losing_user_id = Column(String)  # Add this line
     reasoning = Column(Text)
-    session_id = Column(Integer, ForeignKey("sessions.id"))
+    session_id = Column(Integer, ForeignKey("sessions.id"), unique=True, index=True)
+    judged_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     session = relationship("Session", back_populates="judgement")
 
@@ -83,6 +88,25 @@ class Appeal(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
-    session_id = Column(Integer, ForeignKey("sessions.id"))
+    session_id = Column(Integer, ForeignKey("sessions.id"), index=True)
 
     session = relationship("Session", back_populates="appeals")
+
+class ShadowJudgement(Base):
+    """A judgement produced by an offline re-judging run, kept apart from the live one."""
+    __tablename__ = "shadow_judgements"
+    __table_args__ = (UniqueConstraint("run_id", "session_id", name="uq_shadow_judgements_run_session"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, index=True)
+    model = Column(String)
+    content = Column(Text)
+    winner = Column(String)
+    winning_argument = Column(Text)
+    winning_user_id = Column(String)
+    loser = Column(String)
+    losing_argument = Column(Text)
+    losing_user_id = Column(String)
+    reasoning = Column(Text)
+    # No foreign key: shadow judgements outlive sessions moved to the cold store
+    session_id = Column(Integer, index=True)
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import exists, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import archive, bulk, crud, models, schemas
+from ai_judge import JUDGE_MODEL, get_ai_judgement, resolve_usernames
+from database import SessionLocal, engine
+from migrations import run_migrations
+
+logger = logging.getLogger(__name__)
+
+
+def _judgeable(records: Iterable[dict]) -> Iterator[tuple]:
+    for record in records:
+        if len(record["arguments"]) >= 2:
+            # Plain copies so worker threads never touch the database
+            arguments = [
+                SimpleNamespace(user_id=arg["user_id"], username=arg["username"], content=arg["content"], image_url=arg["image_url"])
+                for arg in record["arguments"]
+            ]
+            yield record["id"], arguments
+
+
+def iter_pending_sessions(db: Session, run_id: str, page_size: int = 500) -> Iterator[tuple]:
+    """Yield (session_id, arguments) for every judgeable session the run has not judged yet.
+
+    Hot sessions come first, then sessions in the cold store. Both are paged by
+    id so no cursor stays open while results are being written. Existing
+    shadow_judgements rows are the checkpoint: a resumed run simply skips
+    sessions that already have a shadow result.
+    """
+    already_judged = exists().where(
+        models.ShadowJudgement.run_id == run_id,
+        models.ShadowJudgement.session_id == models.Session.id,
+    )
+    after_id = 0
+    while True:
+        sessions = db.execute(
+            select(models.Session.__table__)
+            .where(models.Session.id > after_id, ~already_judged)
+            .order_by(models.Session.id)
+            .limit(page_size)
+        ).mappings().all()
+        if not sessions:
+            break
+        records = bulk.records_for_sessions(db, [dict(session) for session in sessions])
+        db.rollback()  # end the read transaction between pages
+        yield from _judgeable(records)
+        after_id = sessions[-1]["id"]
+
+    for records in archive.iter_archived_pages(page_size=page_size):
+        ids = [record["id"] for record in records]
+        # Sessions still in the hot tables were covered above
+        skip = set(db.execute(select(models.Session.id).where(models.Session.id.in_(ids))).scalars())
+        skip.update(db.execute(
+            select(models.ShadowJudgement.session_id)
+            .where(models.ShadowJudgement.run_id == run_id, models.ShadowJudgement.session_id.in_(ids))
+        ).scalars())
+        db.rollback()
+        yield from _judgeable(record for record in records if record["id"] not in skip)
+
+
+def judge_snapshot(arguments: List[SimpleNamespace], model: str) -> schemas.JudgementCreate:
+    # Same ordering and username mapping as the live judge_session endpoint
+    arguments = sorted(arguments, key=lambda arg: arg.user_id)
+    judgement_data = resolve_usernames(get_ai_judgement(arguments, model=model), arguments)
+    # Failed model calls come back without user ids and are rejected here, so they are retried on resume
+    return schemas.JudgementCreate(**judgement_data)
+
+
+class RejudgeRun:
+    def __init__(self, db: Session, run_id: str, model: str = JUDGE_MODEL, concurrency: int = 8, checkpoint_every: int = 50):
+        self.db = db
+        self.run_id = run_id
+        self.model = model
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        self.pending: List[dict] = []
+        self.judged = 0
+        self.failed = 0
+
+    def checkpoint(self):
+        if not self.pending:
+            return
+        try:
+            self.db.execute(insert(models.ShadowJudgement), self.pending)
+            self.db.commit()
+            self.judged += len(self.pending)
+        except IntegrityError:
+            self.db.rollback()
+            # Another process with the same run id stored some of these sessions;
+            # keep its results and still save the rest of the batch one by one.
+            for row in self.pending:
+                try:
+                    self.db.execute(insert(models.ShadowJudgement), row)
+                    self.db.commit()
+                    self.judged += 1
+                except IntegrityError:
+                    self.db.rollback()
+                    logger.warning(f"Session {row['session_id']} already has a result for run {self.run_id}")
+        self.pending = []
+
+    async def _judge_one(self, semaphore: asyncio.Semaphore, session_id: int, arguments: List[SimpleNamespace]):
+        try:
+            judgement = await asyncio.to_thread(judge_snapshot, arguments, self.model)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Re-judging session {session_id} failed: {str(e)}")
+            return
+        finally:
+            semaphore.release()
+
+        self.pending.append({**judgement.dict(), "run_id": self.run_id, "model": self.model, "session_id": session_id})
+        if len(self.pending) >= self.checkpoint_every:
+            self.checkpoint()
+
+    async def run(self, limit: int | None = None, page_size: int = 500):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        started = 0
+        for session_id, arguments in iter_pending_sessions(self.db, self.run_id, page_size=page_size):
+            if limit is not None and started >= limit:
+                break
+            # Acquire before creating the task so at most `concurrency` sessions are in memory
+            await semaphore.acquire()
+            task = asyncio.create_task(self._judge_one(semaphore, session_id, arguments))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            started += 1
+        await asyncio.gather(*tasks)
+        self.checkpoint()
+
+
+def diff_run(db: Session, run_id: str) -> dict:
+    """Compare a run's shadow judgements with the live judgements of the same sessions.
+
+    Verdicts are compared by winning user id. Live judgements made before the
+    prompt included user ids may name an id that is not a participant; those
+    sessions are counted as unverifiable rather than changed.
+    """
+    shadows = (
+        db.query(models.ShadowJudgement.session_id, models.ShadowJudgement.winning_user_id)
+        .filter(models.ShadowJudgement.run_id == run_id)
+        .order_by(models.ShadowJudgement.session_id)
+        .all()
+    )
+    compared, unverifiable, changed = 0, 0, []
+    for session_id, shadow_winner in shadows:
+        db.expunge_all()  # keep the identity map from growing over a long run
+        # Hot or archived, like the live read path
+        session = crud.get_session(db, session_id=session_id)
+        if session is None or session.judgement is None:
+            continue
+        participants = {arg.user_id for arg in session.arguments}
+        if shadow_winner not in participants or session.judgement.winning_user_id not in participants:
+            unverifiable += 1
+            continue
+        compared += 1
+        if shadow_winner != session.judgement.winning_user_id:
+            changed.append(session_id)
+    return {"compared": compared, "unverifiable": unverifiable, "changed": len(changed), "changed_session_ids": changed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-judge stored sessions into shadow_judgements without touching live state.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Start or resume a re-judging run")
+    run_parser.add_argument("run_id", help="Name of the run; reuse it to resume")
+    run_parser.add_argument("--model", default=JUDGE_MODEL)
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--checkpoint-every", type=int, default=50)
+    run_parser.add_argument("--limit", type=int, default=None, help="Stop after this many sessions")
+
+    diff_parser = subparsers.add_parser("diff", help="Compare a run's verdicts with the live judgements")
+    diff_parser.add_argument("run_id")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        if args.command == "run":
+            rejudge = RejudgeRun(db, args.run_id, model=args.model, concurrency=args.concurrency, checkpoint_every=args.checkpoint_every)
+            start = time.perf_counter()
+            asyncio.run(rejudge.run(limit=args.limit))
+            elapsed = time.perf_counter() - start
+            print(f"Run {args.run_id}: judged {rejudge.judged}, failed {rejudge.failed} in {elapsed:.1f}s")
+        else:
+            result = diff_run(db, args.run_id)
+            print(f"Run {args.run_id}: {result['changed']} of {result['compared']} verdicts changed, {result['unverifiable']} unverifiable")
+            for session_id in result["changed_session_ids"]:
+                print(session_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
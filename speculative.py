@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, List
+
+from ai_judge import PreparedArgument, prepare_argument
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativePreparer:
+    """Prepares the first argument of a session while the second one is still being written.
+
+    Preparation runs in a worker thread. Cancelling a task discards its result,
+    but a model call that has already started runs to completion in its thread.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self.tasks: "OrderedDict[int, asyncio.Task]" = OrderedDict()
+        self.metrics: Dict[str, float] = {
+            "started": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "seconds_saved": 0.0,
+            "judgements": 0,
+            "judgement_seconds": 0.0,
+        }
+
+    async def _run(self, argument) -> tuple[PreparedArgument, float]:
+        start = time.perf_counter()
+        prepared = await asyncio.to_thread(prepare_argument, argument)
+        return prepared, time.perf_counter() - start
+
+    def start(self, argument):
+        if argument.id is None or argument.id in self.tasks:
+            return
+        # Snapshot the fields so the worker thread never touches the ORM object
+        snapshot = SimpleNamespace(
+            user_id=argument.user_id,
+            username=argument.username,
+            content=argument.content,
+            image_url=argument.image_url,
+        )
+        self.tasks[argument.id] = asyncio.create_task(self._run(snapshot))
+        self.metrics["started"] += 1
+
+        while len(self.tasks) > self.max_pending:
+            argument_id, _ = next(iter(self.tasks.items()))
+            self.cancel(argument_id)
+
+    def cancel(self, argument_id: int):
+        task = self.tasks.pop(argument_id, None)
+        if task and not task.done():
+            task.cancel()
+            self.metrics["cancelled"] += 1
+
+    def cancel_all(self):
+        for argument_id in list(self.tasks):
+            self.cancel(argument_id)
+
+    async def _take(self, argument) -> PreparedArgument:
+        task = self.tasks.pop(argument.id, None) if argument.id is not None else None
+        if task:
+            waited_from = time.perf_counter()
+            try:
+                prepared, elapsed = await task
+                self.metrics["hits"] += 1
+                # Only the part of the preparation that finished before we needed it is saved
+                self.metrics["seconds_saved"] += max(0.0, elapsed - (time.perf_counter() - waited_from))
+                return prepared
+            except asyncio.CancelledError:
+                # Only swallow the cancellation of the speculative task itself
+                if not task.cancelled():
+                    raise
+            except Exception as e:
+                self.metrics["failed"] += 1
+                logger.error(f"Speculative preparation failed for argument {argument.id}: {str(e)}")
+        self.metrics["misses"] += 1
+        return await asyncio.to_thread(prepare_argument, argument)
+
+    async def prepare(self, arguments: List) -> List[PreparedArgument]:
+        """Return prepared arguments, reusing speculative work and preparing the rest concurrently."""
+        return list(await asyncio.gather(*(self._take(arg) for arg in arguments)))
+
+    def record_judgement(self, seconds: float):
+        self.metrics["judgements"] += 1
+        self.metrics["judgement_seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        metrics = dict(self.metrics)
+        metrics["pending"] = len(self.tasks)
+        metrics["avg_judgement_seconds"] = (
+            metrics["judgement_seconds"] / metrics["judgements"] if metrics["judgements"] else 0.0
+        )
+        return metrics
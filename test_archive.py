@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import archive, bulk, crud, database, models
+from main import app
+
+client = TestClient(app)
+
+
+def add_debate(db, session_id, judged_days_ago=None, arguments=("a", "b")):
+    db.add(models.Session(id=session_id, name=f"debate {session_id}", user1_id="a", user2_id="b"))
+    for user_id in arguments:
+        db.add(models.Argument(session_id=session_id, user_id=user_id, username=user_id, content=f"Argument by {user_id}"))
+    if judged_days_ago is not None:
+        db.add(models.Judgement(
+            session_id=session_id, content="Judged", winner="a", winning_argument="", winning_user_id="a",
+            loser="b", losing_argument="", losing_user_id="b", reasoning="",
+            judged_at=datetime.utcnow() - timedelta(days=judged_days_ago),
+        ))
+    db.commit()
+
+
+def test_archived_child_ids_are_not_reused():
+    with database.SessionLocal() as db:
+        add_debate(db, 1, judged_days_ago=2)
+        add_debate(db, 2, judged_days_ago=2)
+        add_debate(db, 3, arguments=())
+        # Session 2 owns the newest argument and judgement, so only session 1 goes
+        assert archive.archive_finished_sessions(db) == 1
+
+        db.add(models.Argument(session_id=3, user_id="a", username="a", content="Opening"))
+        db.commit()
+        lines = list(bulk.export_ndjson(db))
+
+    argument_ids = [row["id"] for line in lines for row in json.loads(line)["arguments"]]
+    assert sorted(argument_ids) == [1, 2, 3, 4, 5]
+
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.SessionLocal() as db:
+        counts = bulk.import_ndjson(db, lines)
+    assert counts["sessions"] == 3 and counts["arguments"] == 5
+
+
+def test_archived_session_is_read_from_cold_store():
+    with database.SessionLocal() as db:
+        add_debate(db, 1, judged_days_ago=2)
+        add_debate(db, 2, judged_days_ago=0)
+        assert archive.archive_finished_sessions(db) == 1
+        assert db.get(models.Session, 1) is None
+        assert db.query(models.Argument).filter(models.Argument.session_id == 1).count() == 0
+
+        session = crud.get_session(db, session_id=1)
+    assert session.archived
+    assert [arg.content for arg in session.arguments] == ["Argument by a", "Argument by b"]
+    assert session.judgement.winning_user_id == "a"
+
+    response = client.get("/sessions/1", params={"userId": "a"})
+    assert response.status_code == 200
+    assert response.json()["judgement"]["content"] == "Judged"
+
+
+def test_writes_to_archived_session_are_rejected():
+    with database.SessionLocal() as db:
+        add_debate(db, 1, judged_days_ago=2)
+        add_debate(db, 2, judged_days_ago=0)
+        archive.archive_finished_sessions(db)
+
+    response = client.post("/sessions/1/arguments/", data={"content": "Late", "userId": "a", "username": "a"})
+    assert response.status_code == 409
+    response = client.post("/sessions/1/update_username", json={"user": "user1", "username": "new", "userId": "a"})
+    assert response.status_code == 409
+    with database.SessionLocal() as db:
+        assert db.query(models.Argument).filter(models.Argument.session_id == 1).count() == 0
+
+
+def add_image(name, hours_old):
+    path = os.path.join(archive.IMAGES_DIR, name)
+    with open(path, "wb") as image:
+        image.write(b"image")
+    mtime = time.time() - hours_old * 3600
+    os.utime(path, (mtime, mtime))
+    return f"/images/{name}"
+
+
+def test_orphaned_images_are_collected():
+    with database.SessionLocal() as db:
+        add_debate(db, 1, judged_days_ago=2)
+        add_debate(db, 2, judged_days_ago=0)
+        archived_url = add_image("archived.png", hours_old=48)
+        hot_url = add_image("hot.png", hours_old=48)
+        db.query(models.Argument).filter(models.Argument.session_id == 1).first().image_url = archived_url
+        db.query(models.Argument).filter(models.Argument.session_id == 2).first().image_url = hot_url
+        db.commit()
+        assert archive.archive_finished_sessions(db) == 1
+
+        add_image("orphan.png", hours_old=48)
+        # Written by an upload whose argument is not committed yet
+        add_image("recent.png", hours_old=0)
+
+        assert archive.collect_orphaned_images(db) == 1
+    assert sorted(os.listdir(archive.IMAGES_DIR)) == ["archived.png", "hot.png", "recent.png"]
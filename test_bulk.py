@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import bulk, database, models
+
+
+def add_debate(db, session_id):
+    db.add(models.Session(id=session_id, name=f"debate {session_id}", description="Ünïcode \"quotes\"\nand lines", user1_id="a", user2_id="b"))
+    for user_id in ("a", "b"):
+        db.add(models.Argument(session_id=session_id, user_id=user_id, username=user_id, content=f"Argument by {user_id}",
+                               image_url=f"/images/{session_id}{user_id}.png"))
+    db.add(models.Judgement(session_id=session_id, content="Judged", winner="a", winning_argument="", winning_user_id="a",
+                            loser="b", losing_argument="", losing_user_id="b", reasoning="", judged_at=datetime(2024, 5, 1, 12, 30)))
+    db.add(models.Appeal(session_id=session_id, content="Unfair"))
+    # Appeal judgements are not unique per session, and every row must survive
+    for content in ("First appeal judgement", "Second appeal judgement"):
+        db.add(models.AppealJudgement(session_id=session_id, content=content, winner="a", winning_argument="",
+                                      loser="b", losing_argument="", reasoning=""))
+
+
+def test_export_import_round_trip():
+    with database.SessionLocal() as db:
+        for session_id in range(1, 6):
+            add_debate(db, session_id)
+        # A session with no children at all
+        db.add(models.Session(id=6, name="empty"))
+        db.commit()
+        exported = list(bulk.export_ndjson(db, batch_size=2))
+    assert len(exported) == 6
+
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.SessionLocal() as db:
+        counts = bulk.import_ndjson(db, exported, batch_size=4)
+        assert counts == {"sessions": 6, "arguments": 10, "judgements": 5, "appeals": 5, "appeal_judgements": 10}
+        assert list(bulk.export_ndjson(db, batch_size=3)) == exported
@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+
+import database, models
+from main import app
+
+client = TestClient(app)
+
+
+def add_session(SessionFactory, session_id, name, user1_id=None, user2_id=None):
+    with SessionFactory() as db:
+        db.add(models.Session(id=session_id, name=name, user1_id=user1_id, user2_id=user2_id))
+        db.commit()
+
+
+def test_engines_are_separate():
+    assert database.read_engine is not database.engine
+    assert database.read_engine.url.database != database.engine.url.database
+
+
+def test_read_session_uses_replica():
+    add_session(database.SessionLocal, 1, "primary", "a", "b")
+    add_session(database.ReadSessionLocal, 1, "replica", "a", "b")
+
+    response = client.get("/sessions/1", params={"userId": "a"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "replica"
+
+
+def test_read_session_falls_back_to_primary():
+    # Not replicated yet
+    add_session(database.SessionLocal, 2, "primary only", "a", "b")
+
+    response = client.get("/sessions/2", params={"userId": "a"})
+    assert response.status_code == 200
+    assert response.json()["name"] == "primary only"
+
+
+def test_slot_claim_is_written_to_primary():
+    add_session(database.SessionLocal, 3, "primary", "a")
+    add_session(database.ReadSessionLocal, 3, "replica", "a")
+
+    response = client.get("/sessions/3", params={"userId": "b"})
+    assert response.status_code == 200
+    assert response.json()["user2_id"] == "b"
+    with database.SessionLocal() as db:
+        assert db.get(models.Session, 3).user2_id == "b"
+    with database.ReadSessionLocal() as db:
+        assert db.get(models.Session, 3).user2_id is None
+
+
+def test_missing_session_is_404():
+    response = client.get("/sessions/999", params={"userId": "a"})
+    assert response.status_code == 404
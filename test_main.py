@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi.testclient import TestClient
+
+import archive, crud, database, main, models
+from main import app
+
+client = TestClient(app)
+
+
+def add_session(session_id, user1_id="a", user2_id="b"):
+    with database.SessionLocal() as db:
+        db.add(models.Session(id=session_id, name="debate", user1_id=user1_id, user2_id=user2_id))
+        db.commit()
+
+
+async def submit(client, session_id, user_id):
+    return await client.post(
+        f"/sessions/{session_id}/arguments/",
+        data={"content": f"Argument by {user_id}", "userId": user_id, "username": user_id},
+        files={"image": (f"{user_id}.png", b"image", "image/png")},
+    )
+
+
+def test_concurrent_arguments_are_judged_once(fake_judge, monkeypatch):
+    add_session(1)
+    # Hold both requests after staging their argument so neither has committed
+    # when the other one looks at the session
+    staged = []
+    both_staged = asyncio.Event()
+    create_argument = crud.create_argument
+
+    async def create_argument_together(*args, **kwargs):
+        argument = await create_argument(*args, **kwargs)
+        staged.append(argument)
+        if len(staged) == 2:
+            both_staged.set()
+        await both_staged.wait()
+        return argument
+
+    monkeypatch.setattr(crud, "create_argument", create_argument_together)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(submit(client, 1, "a"), submit(client, 1, "b"))
+
+    responses = asyncio.run(run())
+    assert [response.status_code for response in responses] == [200, 200]
+    main.speculator.cancel_all()
+
+    with database.SessionLocal() as db:
+        assert len(crud.get_arguments_by_session(db, session_id=1)) == 2
+        judgements = db.query(models.Judgement).filter(models.Judgement.session_id == 1).all()
+    assert len(judgements) == 1
+    assert judgements[0].winning_user_id == "a"
+    assert fake_judge
+
+
+def test_second_judgement_does_not_replace_the_first(fake_judge, monkeypatch):
+    add_session(2)
+    with database.SessionLocal() as db:
+        db.add(models.Argument(session_id=2, user_id="a", username="a", content="First"))
+        db.commit()
+
+    judge = main.get_ai_judgement
+
+    def judged_meanwhile(arguments, appeal=None, model=None):
+        # The other side's request stores its judgement while this one waits on the model
+        with database.SessionLocal() as db:
+            db.add(models.Judgement(session_id=2, content="Concurrent", winner="b", winning_argument="", winning_user_id="b",
+                                    loser="a", losing_argument="", losing_user_id="a", reasoning=""))
+            db.commit()
+        return judge(arguments, appeal, model)
+
+    monkeypatch.setattr(main, "get_ai_judgement", judged_meanwhile)
+    response = client.post("/sessions/2/arguments/", data={"content": "Second", "userId": "b", "username": "b"})
+    assert response.status_code == 200
+
+    with database.SessionLocal() as db:
+        judgements = db.query(models.Judgement).filter(models.Judgement.session_id == 2).all()
+    assert [judgement.content for judgement in judgements] == ["Concurrent"]
+
+
+def add_judgement(session_id, judged_at):
+    with database.SessionLocal() as db:
+        db.add(models.Judgement(session_id=session_id, content="Judged", winner="a", winning_argument="", winning_user_id="a",
+                                loser="b", losing_argument="", losing_user_id="b", reasoning="", judged_at=judged_at))
+        db.commit()
+
+
+def test_appeal_after_window_is_rejected():
+    add_session(3)
+    add_judgement(3, datetime.utcnow() - archive.APPEAL_WINDOW - timedelta(minutes=1))
+
+    response = client.post("/sessions/3/appeal/", json={"content": "Unfair", "user_id": "b"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "The appeal window for this session has closed"
+
+
+def test_appeal_by_winner_is_forbidden():
+    add_session(4)
+    add_judgement(4, datetime.utcnow())
+
+    response = client.post("/sessions/4/appeal/", json={"content": "More", "user_id": "a"})
+    assert response.status_code == 403
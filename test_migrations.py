@@ -0,0 +1,35 @@
+import logging
+import os
+import shutil
+
+from sqlalchemy import text
+
+from database import make_engine
+from migrations import MIGRATIONS, run_migrations
+
+BASELINE_DB = os.path.join(os.path.dirname(__file__), "sql_app.db")
+
+
+def test_baseline_database_migrates_and_dedupes_judgements(tmp_path, caplog):
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    bind = make_engine(f"sqlite:///{path}")
+    with bind.begin() as connection:
+        judgements = connection.execute(text("SELECT COUNT(*) FROM judgements")).scalar()
+        # Two sessions judged twice, as the baseline allowed
+        for session_id in connection.execute(text("SELECT session_id FROM judgements ORDER BY id LIMIT 2")).scalars().all():
+            connection.execute(text(
+                "INSERT INTO judgements (content, winner, session_id) VALUES ('Rejudged', 'b', :session_id)"
+            ), {"session_id": session_id})
+
+    with caplog.at_level(logging.WARNING, logger="migrations"):
+        assert run_migrations(bind) == MIGRATIONS[-1][0]
+    assert "Deleting 2 older duplicate judgements" in caplog.text
+
+    with bind.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM judgements")).scalar() == judgements
+        assert connection.execute(text("SELECT COUNT(*) FROM judgements WHERE content = 'Rejudged'")).scalar() == 2
+        assert connection.execute(text("SELECT COUNT(*) FROM judgements WHERE judged_at IS NULL")).scalar() == 0
+    # Already at the latest version, so a second run changes nothing
+    assert run_migrations(bind) == MIGRATIONS[-1][0]
+    bind.dispose()